@@ -1,15 +1,18 @@
 import asyncio
+import inspect
 from typing import AsyncGenerator
-import os
 from pathlib import Path
-import re
 
-# Configuration for XSUAA repository scanning
-XSUAA_REPO_PATH = os.getenv("XSUAA_REPO_PATH", "/Users/I567440/Desktop/Coding/SAP/xsuaa")
-ALLOWED_EXTENSIONS = {".py", ".js", ".ts", ".vue", ".java", ".json", ".yaml", ".yml", ".md", ".txt", ".jsx", ".tsx"}
-BLACKLIST_DIRS = {"node_modules", "dist", "build", "__pycache__", ".git", "target", "venv", ".env"}
-BLACKLIST_FILES = {".env", ".key", ".pem", ".p12", ".jks"}
-MAX_FILE_SIZE = 1024 * 1024  # 1MB
+from backend.repos import (
+    ALLOWED_EXTENSIONS, BLACKLIST_DIRS, BLACKLIST_FILES, MAX_FILE_SIZE, SHARDS,
+    locate,
+)
+from backend.search import search_files, search_functions
+from backend.arithmetic import evaluate, parse_arithmetic
+from backend.profiling import profiled
+
+# Requests answered by the local arithmetic evaluator instead of the LLM
+ARITHMETIC_STATS = {"fast_path": 0}
 
 # Attempt to import actual libraries used in the notebook; if unavailable, fall back to a simple implementation
 try:
@@ -48,69 +51,22 @@ if LANG_AVAILABLE:
         return a / b
 
     @tool
-    def search_xsuaa_files(keyword: str, file_pattern: str = "*") -> str:
-        """Search for files in the XSUAA repository containing a specific keyword.
+    def search_xsuaa_files(keyword: str, file_pattern: str = "*", repo: str = "") -> str:
+        """Search for files in the XSUAA repositories containing a specific keyword.
 
         Args:
             keyword: The keyword or pattern to search for in file contents (case-insensitive)
             file_pattern: Optional file name pattern (e.g., '*.py' for Python files, '*auth*' for files with 'auth' in name)
+            repo: Optional repository name (or comma-separated names) to restrict the search to; default searches all
 
         Returns:
-            A formatted string listing matching files with line numbers and context
+            Matching lines grouped by file, each as 'line: text' under the file path
         """
-        try:
-            if not os.path.exists(XSUAA_REPO_PATH):
-                return f"Error: XSUAA repository not found at {XSUAA_REPO_PATH}"
-
-            results = []
-            keyword_lower = keyword.lower()
-
-            for root, dirs, files in os.walk(XSUAA_REPO_PATH):
-                # Skip blacklisted directories
-                dirs[:] = [d for d in dirs if d not in BLACKLIST_DIRS]
-
-                for file in files:
-                    # Check file extension and blacklist
-                    if Path(file).suffix not in ALLOWED_EXTENSIONS:
-                        continue
-                    if any(bl in file for bl in BLACKLIST_FILES):
-                        continue
-
-                    # Check file pattern match
-                    if file_pattern != "*" and not Path(file).match(file_pattern):
-                        continue
-
-                    file_path = Path(root) / file
-
-                    # Check file size
-                    if file_path.stat().st_size > MAX_FILE_SIZE:
-                        continue
-
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            lines = f.readlines()
-                            for i, line in enumerate(lines, 1):
-                                if keyword_lower in line.lower():
-                                    rel_path = file_path.relative_to(XSUAA_REPO_PATH)
-                                    results.append(f"{rel_path}:{i}: {line.strip()}")
-                    except Exception:
-                        continue
-
-            if not results:
-                return f"No files found containing '{keyword}' in the XSUAA repository."
-
-            # Limit results to avoid overwhelming the LLM
-            if len(results) > 50:
-                results = results[:50]
-                results.append(f"... (showing first 50 matches)")
-
-            return "\n".join(results)
-        except Exception as e:
-            return f"Error searching files: {str(e)}"
+        return search_files(keyword, file_pattern, repo).render()
 
     @tool
-    def search_xsuaa_functions(function_name: str) -> str:
-        """Search for function, method, or endpoint definitions in the XSUAA repository.
+    def search_xsuaa_functions(function_name: str, repo: str = "") -> str:
+        """Search for function, method, or endpoint definitions in the XSUAA repositories.
 
         This tool searches for function/method definitions, REST endpoints, and API routes.
         It looks for common patterns like:
@@ -121,104 +77,41 @@ if LANG_AVAILABLE:
 
         Args:
             function_name: The name of the function, method, or endpoint to search for (e.g., 'updateIdentityProvider')
+            repo: Optional repository name (or comma-separated names) to restrict the search to; default searches all
 
         Returns:
-            Matching function definitions with file paths, line numbers, and context
+            Matching definitions grouped by file, with numbered context lines ('>' marks the definition)
         """
-        try:
-            if not os.path.exists(XSUAA_REPO_PATH):
-                return f"Error: XSUAA repository not found at {XSUAA_REPO_PATH}"
-
-            results = []
-
-            # Build regex patterns for different programming languages
-            patterns = [
-                # Python: def function_name, async def function_name
-                rf"(async\s+)?def\s+{re.escape(function_name)}\s*\(",
-                # JavaScript/TypeScript: function functionName, const functionName =, functionName:
-                rf"(async\s+)?function\s+{re.escape(function_name)}\s*\(",
-                rf"(const|let|var)\s+{re.escape(function_name)}\s*=\s*(async\s+)?\(",
-                rf"{re.escape(function_name)}\s*:\s*(async\s+)?\(",
-                # Java: public/private/protected returnType functionName(
-                rf"(public|private|protected)\s+\w+\s+{re.escape(function_name)}\s*\(",
-                # REST endpoints with the function name in path or handler
-                rf"@(app|router|RequestMapping|GetMapping|PostMapping|PutMapping|DeleteMapping|PatchMapping).*{re.escape(function_name)}",
-                rf"(app|router)\.(get|post|put|delete|patch)\([^)]*{re.escape(function_name)}",
-                # Class definitions
-                rf"class\s+{re.escape(function_name)}",
-            ]
-
-            for root, dirs, files in os.walk(XSUAA_REPO_PATH):
-                dirs[:] = [d for d in dirs if d not in BLACKLIST_DIRS]
-
-                for file in files:
-                    if Path(file).suffix not in ALLOWED_EXTENSIONS:
-                        continue
-                    if any(bl in file for bl in BLACKLIST_FILES):
-                        continue
-
-                    file_path = Path(root) / file
-
-                    if file_path.stat().st_size > MAX_FILE_SIZE:
-                        continue
-
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            lines = f.readlines()
-
-                        for i, line in enumerate(lines, 1):
-                            # Check if any pattern matches
-                            for pattern in patterns:
-                                if re.search(pattern, line, re.IGNORECASE):
-                                    rel_path = file_path.relative_to(XSUAA_REPO_PATH)
-                                    # Include context: 2 lines before and 5 lines after
-                                    context_start = max(0, i - 3)
-                                    context_end = min(len(lines), i + 6)
-                                    context_lines = []
-                                    for j in range(context_start, context_end):
-                                        marker = ">>>" if j == i - 1 else "   "
-                                        context_lines.append(f"{marker} {j+1:4d} | {lines[j].rstrip()}")
-
-                                    results.append(f"\n{rel_path}:{i}\n" + "\n".join(context_lines))
-                                    break  # Don't match multiple patterns on same line
-                    except Exception:
-                        continue
-
-            if not results:
-                return f"No function or endpoint definitions found for '{function_name}' in the XSUAA repository.\nTip: Try searching with search_xsuaa_files('{function_name}') for broader results."
-
-            # Limit results
-            if len(results) > 20:
-                results = results[:20]
-                results.append(f"\n... (showing first 20 matches. Use read_xsuaa_file to see complete implementations)")
-
-            return "\n".join(results)
-        except Exception as e:
-            return f"Error searching for functions: {str(e)}"
+        return search_functions(function_name, repo).render()
 
     @tool
-    def read_xsuaa_file(file_path: str, start_line: int = 1, end_line: int = -1) -> str:
-        """Read the content of a specific file in the XSUAA repository.
+    def read_xsuaa_file(file_path: str, start_line: int = 1, end_line: int = -1, repo: str = "") -> str:
+        """Read the content of a specific file in an XSUAA repository.
 
         Args:
-            file_path: Relative path to the file within the XSUAA repository
+            file_path: Relative path to the file, as shown in search results (prefixed with the repo name when several repos are configured)
             start_line: Starting line number (1-based, default: 1)
             end_line: Ending line number (1-based, default: -1 for entire file)
+            repo: Optional repository name; only needed if file_path is not prefixed with it
 
         Returns:
             The file content with line numbers
         """
         try:
-            # Strip leading slash if present to ensure relative path
-            file_path = file_path.lstrip('/')
-            full_path = Path(XSUAA_REPO_PATH) / file_path
+            try:
+                shard, rel_path = locate(file_path, repo)
+            except KeyError as e:
+                return f"Error: {e.args[0]}"
+            if shard is None:
+                return f"Error: File path must start with a repository name ({', '.join(SHARDS)})"
+
+            full_path = shard.resolve(rel_path)
+            if full_path is None:
+                return "Error: Access denied - path outside XSUAA repository"
 
             if not full_path.exists():
                 return f"Error: File not found at {file_path}"
 
-            if not str(full_path).startswith(str(Path(XSUAA_REPO_PATH).resolve())):
-                return "Error: Access denied - path outside XSUAA repository"
-
             if full_path.stat().st_size > MAX_FILE_SIZE:
                 return f"Error: File too large (max {MAX_FILE_SIZE} bytes)"
 
@@ -240,27 +133,35 @@ if LANG_AVAILABLE:
             return f"Error reading file: {str(e)}"
 
     @tool
-    def list_xsuaa_structure(directory: str = ".", max_depth: int = 3) -> str:
-        """List the directory structure of the XSUAA repository.
+    def list_xsuaa_structure(directory: str = ".", max_depth: int = 3, repo: str = "") -> str:
+        """List the directory structure of the XSUAA repositories.
 
         Args:
-            directory: Relative directory path within XSUAA repository (default: root)
+            directory: Relative directory path (default: root; prefixed with the repo name when several repos are configured)
             max_depth: Maximum depth to traverse (default: 3)
+            repo: Optional repository name; only needed if directory is not prefixed with it
 
         Returns:
             A tree-like structure of directories and files
         """
         try:
-            # Strip leading slash if present to ensure relative path
-            directory = directory.lstrip('/')
-            full_path = Path(XSUAA_REPO_PATH) / directory
+            try:
+                shard, rel_dir = locate(directory, repo)
+            except KeyError as e:
+                return f"Error: {e.args[0]}"
+            if shard is None:
+                if directory.strip("/") in ("", "."):
+                    # Several repos and no repo selected: list the configured repositories
+                    return "\n".join(["Configured repositories:"] + [f"├── {name}/ ({s.root})" for name, s in SHARDS.items()])
+                return f"Error: Directory path must start with a repository name ({', '.join(SHARDS)})"
+
+            full_path = shard.resolve(rel_dir)
+            if full_path is None:
+                return "Error: Access denied - path outside XSUAA repository"
 
             if not full_path.exists():
                 return f"Error: Directory not found at {directory}"
 
-            if not str(full_path).startswith(str(Path(XSUAA_REPO_PATH).resolve())):
-                return "Error: Access denied - path outside XSUAA repository"
-
             def build_tree(path: Path, prefix: str = "", depth: int = 0) -> list:
                 if depth > max_depth:
                     return []
@@ -288,7 +189,9 @@ if LANG_AVAILABLE:
 
                 return items
 
-            tree = [f"{directory}/ (XSUAA Repository)"]
+            rel_dir = rel_dir.strip("/")
+            label = shard.display(rel_dir) if rel_dir not in ("", ".") else shard.display("").rstrip("/") or "."
+            tree = [f"{label}/ (XSUAA Repository)"]
             tree.extend(build_tree(full_path))
 
             return "\n".join(tree)
@@ -304,6 +207,24 @@ if LANG_AVAILABLE:
         if normalized_name != tool.name:
             tools_by_name[normalized_name] = tool
 
+    # Search tools also expose a structured result; stream_agent builds events from it directly
+    structured_tools = {"search_xsuaa_files": search_files, "search_xsuaa_functions": search_functions}
+    for name in list(structured_tools):
+        structured_tools[name.replace("_", "")] = structured_tools[name]
+
+    def structured_args(name: str, args: dict) -> dict:
+        """Validate LLM-provided args like tool.invoke would before calling a structured search.
+
+        Unknown keys and nulls are dropped (so defaults apply), then the @tool args_schema
+        checks and coerces the rest.
+        """
+        params = inspect.signature(structured_tools[name]).parameters
+        cleaned = {k: v for k, v in (args or {}).items() if k in params and v is not None}
+        schema = getattr(tools_by_name[name], "args_schema", None)
+        if hasattr(schema, "model_validate"):
+            cleaned = schema.model_validate(cleaned).model_dump()
+        return cleaned
+
     model_with_tools = llm.bind_tools(tools) if llm is not None else None
 
     class MessagesState(TypedDict):
@@ -349,6 +270,22 @@ async def stream_agent(question: str) -> AsyncGenerator[dict, None]:
 
     Yields items with shape {"type": "analysis|step|final|error", "text": str}
     """
+    # Pure arithmetic ("(3+4)/3", "156 multiplied by 89") is evaluated locally without the LLM
+    expression = parse_arithmetic(question)
+    if expression is not None:
+        try:
+            result, operations = evaluate(expression)
+        except (ZeroDivisionError, OverflowError):
+            pass  # let the LLM explain it
+        else:
+            ARITHMETIC_STATS["fast_path"] += 1
+            print(f"⚡ Arithmetic fast path: {ARITHMETIC_STATS['fast_path']} request(s) bypassed the model", flush=True)
+            for symbol, a, b, value in operations:
+                yield {"type": "step", "text": f"🧮 Computing: {a} {symbol} {b}"}
+                yield {"type": "step", "text": f"✅ Result: {value}"}
+            yield {"type": "final", "text": f"The result is {result}."}
+            return
+
     # If LLM/tools aren't available, fallback to dummy behavior
     if not LANG_AVAILABLE or llm is None or model_with_tools is None:
         if any(tok.isdigit() for tok in question):
@@ -386,10 +323,12 @@ Calculation tools (use ONLY for explicit math requests):
 - divide(a, b): Divide two numbers
 
 Code scanning tools (use for XSUAA code questions):
-- search_xsuaa_functions(function_name): Search for function/method/endpoint definitions (BEST for finding specific functions or endpoints)
-- search_xsuaa_files(keyword, file_pattern): Search for code containing a keyword (BEST for concepts, variables, or general searches)
-- read_xsuaa_file(file_path, start_line, end_line): Read specific file content with line numbers
-- list_xsuaa_structure(directory, max_depth): Show directory structure of XSUAA repository
+- search_xsuaa_functions(function_name, repo): Search for function/method/endpoint definitions (BEST for finding specific functions or endpoints)
+- search_xsuaa_files(keyword, file_pattern, repo): Search for code containing a keyword (BEST for concepts, variables, or general searches)
+- read_xsuaa_file(file_path, start_line, end_line, repo): Read specific file content with line numbers
+- list_xsuaa_structure(directory, max_depth, repo): Show directory structure of XSUAA repository
+The optional repo argument restricts a tool to one repository; searches cover all repositories by default.
+Configured repositories: """ + ", ".join(SHARDS) + """
 
 Rules:
 1. For general knowledge questions → Answer directly WITHOUT tools
@@ -450,7 +389,7 @@ IMPORTANT: When providing your final answer:
         while True:
             loop = asyncio.get_running_loop()
             # invoke the model that has tools bound
-            resp = await loop.run_in_executor(None, lambda: model_with_tools.invoke(state_msgs))
+            resp = await loop.run_in_executor(None, profiled(lambda: model_with_tools.invoke(state_msgs)))
 
             # If the model returned textual content, yield it as analysis
             content = getattr(resp, "content", None)
@@ -468,10 +407,11 @@ IMPORTANT: When providing your final answer:
                     if name in ["search_xsuaa_files", "searchxsuaafiles"]:
                         keyword = args.get("keyword", "")
                         pattern = args.get("file_pattern", "*")
+                        where = args.get("repo") or "XSUAA repository"
                         if pattern and pattern != "*":
-                            yield {"type": "step", "text": f"🔍 Searching XSUAA repository for '{keyword}' in {pattern} files..."}
+                            yield {"type": "step", "text": f"🔍 Searching {where} for '{keyword}' in {pattern} files..."}
                         else:
-                            yield {"type": "step", "text": f"🔍 Searching XSUAA repository for '{keyword}'..."}
+                            yield {"type": "step", "text": f"🔍 Searching {where} for '{keyword}'..."}
                     elif name in ["search_xsuaa_functions", "searchxsuaafunctions"]:
                         function_name = args.get("function_name", "")
                         yield {"type": "step", "text": f"🔎 Searching for function/endpoint definition: {function_name}..."}
@@ -498,14 +438,24 @@ IMPORTANT: When providing your final answer:
                         yield {"type": "step", "text": f"⚙️ Executing: {name}"}
 
                     tool = tools_by_name.get(name)
+                    result = None
                     if tool is None:
                         obs = f"Unknown tool: {name}"
+                    elif name in structured_tools:
+                        try:
+                            def call_search(f=structured_tools[name], a=structured_args(name, args)):
+                                return f(**a)
+                            result = await loop.run_in_executor(None, profiled(call_search))
+                            # The LLM gets the compact rendering grouped per file
+                            obs = result.render()
+                        except Exception as e:
+                            obs = f"Tool {name} failed: {e}"
                     else:
                         try:
                             # Fix closure issue by creating a proper closure with default argument
                             def call_tool(t=tool, a=args):
                                 return t.invoke(a)
-                            obs = await loop.run_in_executor(None, call_tool)
+                            obs = await loop.run_in_executor(None, profiled(call_tool))
                         except Exception as e:
                             obs = f"Tool {name} failed: {e}"
 
@@ -538,32 +488,18 @@ IMPORTANT: When providing your final answer:
                         }
                         # Don't show raw output for file reads since we're showing code snippet
                     elif name in ["search_xsuaa_files", "searchxsuaafiles"]:
-                        # Show search results in a more compact format
-                        result_lines = obs.split('\n')
-                        file_count = len([l for l in result_lines if l.strip() and ':' in l and not l.startswith('...')])
-                        if file_count > 0:
-                            yield {"type": "step", "text": f"✅ Found {file_count} matches in the codebase"}
+                        # Summarize search results from the structured result
+                        if result is not None and result.matches:
+                            yield {"type": "step", "text": f"✅ Found {len(result.matches)} matches in {len(result.by_file())} file(s)"}
                         else:
                             yield {"type": "step", "text": "ℹ️ No matches found"}
                     elif name in ["search_xsuaa_functions", "searchxsuaafunctions"]:
                         # Show function search results summary and emit file references
-                        result_lines = obs.split('\n')
-                        match_count = len([l for l in result_lines if '>>>' in l])
-                        if match_count > 0:
-                            yield {"type": "step", "text": f"✅ Found {match_count} function definition(s)"}
-                            # Extract and emit file references
-                            for line in result_lines:
-                                if line.strip() and ':' in line and not line.startswith(' '):
-                                    parts = line.split(':')
-                                    if len(parts) >= 2:
-                                        file_ref = parts[0].strip()
-                                        line_num = parts[1].strip()
-                                        if file_ref and line_num.isdigit():
-                                            yield {
-                                                "type": "file_reference",
-                                                "file": file_ref,
-                                                "line": int(line_num)
-                                            }
+                        if result is not None and result.matches:
+                            yield {"type": "step", "text": f"✅ Found {len(result.matches)} function definition(s)"}
+                            for m in result.matches:
+                                yield {"type": "file_reference", "file": m.path, "line": m.line,
+                                       "repo": m.repo, "path": m.abs_path}
                         else:
                             yield {"type": "step", "text": "ℹ️ No function definitions found"}
                     elif name in ["list_xsuaa_structure", "listxsuaastructure"]:
@@ -0,0 +1,100 @@
+import ast
+import operator
+import re
+from fractions import Fraction
+from typing import List, Optional, Tuple, Union
+
+Number = Union[int, float]
+
+MAX_EXPRESSION_LENGTH = 200
+
+# Leading phrases that may wrap a bare expression ("What is 3 + 4?", "Calculate (3+4)/3")
+_PREFIX = re.compile(r"^\s*(please\s+)?(what\s+is|what's|calculate|compute|evaluate)\s*:?\s*", re.IGNORECASE)
+_WORDS = [
+    (re.compile(r"\bmultiplied\s+by\b|\btimes\b", re.IGNORECASE), "*"),
+    (re.compile(r"\bdivided\s+by\b|\bover\b", re.IGNORECASE), "/"),
+    (re.compile(r"\bplus\b", re.IGNORECASE), "+"),
+    (re.compile(r"\bminus\b", re.IGNORECASE), "-"),
+]
+# "x"/"×" is multiplication only as a standalone word between operands ("3 x 4"), never in "3x" or "0x10"
+_TIMES = re.compile(r"(?<=[\d)])\s+[xX×]\s+(?=[\d(])")
+_SYMBOLS = str.maketrans({"÷": "/", "−": "-"})
+# Dates and phone numbers ("2024-10-19", "2024-10", "555-123-4567") are not subtractions;
+# a plain "10-5" still is
+_DATE_LIKE = re.compile(r"\d+-\d+-\d+|(?<![\d.])\d{4}-\d{2}(?![\d.])")
+_EXPRESSION = re.compile(r"^[\d\s.+\-*/()]+$")
+
+# Same operation names/symbols the calculation tools use in step events
+_OPS = {
+    ast.Add: ("add", "+", operator.add),
+    ast.Sub: ("subtract", "-", operator.sub),
+    ast.Mult: ("multiply", "×", operator.mul),
+    ast.Div: ("divide", "÷", operator.truediv),
+}
+
+
+def parse_arithmetic(question: str) -> Optional[ast.expr]:
+    """Return the expression tree if the question is a pure arithmetic expression, else None.
+
+    Only numbers, + - * / and parentheses are accepted, and at least one binary operation
+    must be present; anything else is left to the LLM.
+    """
+    text = _PREFIX.sub("", question).strip().rstrip("?=.! ").strip()
+    if not text or len(text) > MAX_EXPRESSION_LENGTH or _DATE_LIKE.search(text):
+        return None
+    text = _TIMES.sub(" * ", text)
+    for pattern, symbol in _WORDS:
+        text = pattern.sub(symbol, text)
+    text = text.translate(_SYMBOLS)
+    if not _EXPRESSION.match(text):
+        return None
+    try:
+        tree = ast.parse(text, mode="eval")
+    except SyntaxError:
+        return None
+    if not isinstance(tree.body, ast.BinOp) or not _is_supported(tree.body):
+        return None
+    return tree.body
+
+
+def _is_supported(node: ast.AST) -> bool:
+    if isinstance(node, ast.Constant):
+        return type(node.value) in (int, float)
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, (ast.UAdd, ast.USub)) and _is_supported(node.operand)
+    if isinstance(node, ast.BinOp):
+        return type(node.op) in _OPS and _is_supported(node.left) and _is_supported(node.right)
+    return False
+
+
+def evaluate(node: ast.expr) -> Tuple[Number, List[Tuple[str, Number, Number, Number]]]:
+    """Evaluate a tree from parse_arithmetic.
+
+    Arithmetic is exact (fractions.Fraction), so "1 / 3 * 3" is 1 and "0.1 + 0.2" is 0.3;
+    only the values reported are converted for display. Returns the result and the
+    (symbol, a, b, result) operations in evaluation order. Raises ZeroDivisionError for
+    division by zero and OverflowError for results that do not fit a float.
+    """
+    steps: List[Tuple[str, Number, Number, Number]] = []
+
+    def visit(n: ast.AST) -> Fraction:
+        if isinstance(n, ast.Constant):
+            # str() keeps decimal literals exact: Fraction("0.1") == 1/10
+            return Fraction(str(n.value)) if isinstance(n.value, float) else Fraction(n.value)
+        if isinstance(n, ast.UnaryOp):
+            value = visit(n.operand)
+            return -value if isinstance(n.op, ast.USub) else value
+        _, symbol, fn = _OPS[type(n.op)]
+        a, b = visit(n.left), visit(n.right)
+        result = fn(a, b)
+        steps.append((symbol, _display(a), _display(b), _display(result)))
+        return result
+
+    return _display(visit(node)), steps
+
+
+def _display(value: Fraction) -> Number:
+    """Whole numbers as exact ints, anything else as the nearest float to 15 significant digits."""
+    if value.denominator == 1:
+        return value.numerator
+    return float(f"{float(value):.15g}")
@@ -1,13 +1,18 @@
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import asyncio
 import json
 import os
 import importlib
+import threading
+import time
 import types
-from typing import AsyncGenerator, Callable, Any
+from typing import AsyncGenerator, Callable, Any, Optional
+
+from backend.notebook import load_notebook
+from backend.profiling import PROFILING_ENABLED, SamplingProfiler, is_profile_id, profile_path, profiled
 
 app = FastAPI()
 
@@ -68,13 +73,122 @@ def _import_agent_callable(path: str) -> Callable[..., Any]:
     return getattr(module, attr)
 
 
+# Max items buffered between a sync agent thread and the response stream
+AGENT_STREAM_BUFFER = int(os.environ.get("AGENT_STREAM_BUFFER", "16"))
+
+_DONE = object()
+
+
+class _Raised:
+    """Carries an exception from the producer thread to the consumer."""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class _AsyncSource:
+    """Carries an async iterable returned by a sync callable back to the event loop."""
+
+    def __init__(self, source: Any):
+        self.source = source
+
+
+async def _bridge_sync_iterable(produce: Callable[[], Any], maxsize: int = AGENT_STREAM_BUFFER):
+    """Run produce() in a worker thread and yield the items of its result as they are produced.
+
+    Items go through a bounded asyncio.Queue, so the worker blocks when the client reads
+    slower than the agent produces. Exceptions raised in the worker are re-raised here;
+    if the consumer stops early (client disconnect, cancellation) the worker stops and
+    closes the underlying generator in its own thread.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        # Blocks this worker thread while the queue is full (backpressure)
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    def pump():
+        it = None
+        try:
+            result = produce()
+            if hasattr(result, "__aiter__"):
+                put(_AsyncSource(result))
+                return
+            it = iter(result)
+            for item in it:
+                if stop.is_set():
+                    return
+                put(item)
+                if stop.is_set():
+                    return
+        except BaseException as e:
+            if not stop.is_set():
+                put(_Raised(e))
+            return
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
+        put(_DONE)
+
+    worker = loop.run_in_executor(None, profiled(pump))
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Raised):
+                raise item.exc
+            if isinstance(item, _AsyncSource):
+                async for it in item.source:
+                    yield it
+                break
+            yield item
+        await worker
+    finally:
+        stop.set()
+        # Free a worker blocked on a full queue so it can see the stop flag
+        while not queue.empty():
+            queue.get_nowait()
+
+
+def _langgraph_events(update: dict):
+    """Translate one LangGraph stream_mode="updates" chunk into agent events."""
+    for node_output in update.values():
+        for msg in (node_output or {}).get("messages", []):
+            msg_type = getattr(msg, "type", "")
+            content = getattr(msg, "content", "")
+            tool_calls = getattr(msg, "tool_calls", None)
+            if tool_calls:
+                if content:
+                    yield {"type": "analysis", "text": content}
+                for tc in tool_calls:
+                    yield {"type": "step", "text": f"⚙️ Executing: {tc.get('name')}({tc.get('args', {})})"}
+            elif msg_type == "tool":
+                yield {"type": "step", "text": f"✅ Result: {content}"}
+            elif msg_type == "ai":
+                yield {"type": "final", "text": content}
+
+
+def _is_langgraph_graph(obj: Any) -> bool:
+    """True for compiled LangGraph graphs only, not other LangChain Runnables (chains, models)."""
+    try:
+        from langgraph.pregel import Pregel
+    except ImportError:
+        return False
+    return isinstance(obj, Pregel)
+
+
 def _ensure_async_generator(obj: Any) -> Callable[[str], AsyncGenerator[dict, None]]:
     """Wrap different callable types into an async generator interface.
 
     Supported input types:
     - async generator function: used as-is
+    - compiled LangGraph graph (has .stream): node updates streamed from a worker thread
     - async function returning iterable/list: will iterate and yield
-    - sync function returning iterable/list: will run in thread and yield
+    - sync function returning iterable/generator: will run in thread, items streamed as produced
     """
     import inspect
 
@@ -83,6 +197,16 @@ def _ensure_async_generator(obj: Any) -> Callable[[str], AsyncGenerator[dict, No
         # Return as-is, it already returns an async generator
         return obj
 
+    # LangGraph compiled graphs (e.g. the notebook's `agent`) are not plain callables
+    if _is_langgraph_graph(obj):
+        async def runner(question: str):
+            def produce():
+                updates = obj.stream({"messages": [("user", question)]}, stream_mode="updates")
+                return (event for update in updates for event in _langgraph_events(update))
+            async for item in _bridge_sync_iterable(produce):
+                yield item
+        return runner
+
     # Check if it's an async function (coroutine function)
     if asyncio.iscoroutinefunction(obj):
         async def runner(question: str):
@@ -91,10 +215,14 @@ def _ensure_async_generator(obj: Any) -> Callable[[str], AsyncGenerator[dict, No
             if hasattr(res, "__aiter__"):
                 async for item in res:
                     yield item
-            # Otherwise treat as iterable
-            else:
+            # Already materialized: nothing to wait for
+            elif isinstance(res, (list, tuple)):
                 for it in res:
                     yield it
+            # Lazy sync iterable: pull it off the event loop
+            else:
+                async for it in _bridge_sync_iterable(lambda: res):
+                    yield it
         return runner
 
     # sync callable
@@ -103,15 +231,9 @@ def _ensure_async_generator(obj: Any) -> Callable[[str], AsyncGenerator[dict, No
 
     if is_sync_callable(obj):
         async def runner(question: str):
-            loop = asyncio.get_running_loop()
-            items = await loop.run_in_executor(None, lambda: obj(question))
-            # If items is an async generator, iterate async
-            if hasattr(items, "__aiter__"):
-                async for it in items:
-                    yield it
-            else:
-                for it in items:
-                    yield it
+            # Call and iterate in the same worker thread so each item goes out as soon as it exists
+            async for it in _bridge_sync_iterable(lambda: obj(question)):
+                yield it
 
         return runner
 
@@ -136,29 +258,16 @@ if _agent_runner is None:
     AGENT_VAR = os.environ.get("AGENT_VAR", "agent")
     if AGENT_NOTEBOOK:
         try:
-            nb_path = os.path.abspath(AGENT_NOTEBOOK)
-            with open(nb_path, "r", encoding="utf-8") as fh:
-                nb = json.load(fh)
-
-            # Collect code cells and concatenate their source into one string
-            code_list = []
-            for cell in nb.get("cells", []):
-                if cell.get("cell_type") != "code":
-                    continue
-                src = cell.get("source", "")
-                if isinstance(src, list):
-                    src = "".join(src)
-                code_list.append(src)
-            code_cells = "\n\n".join(code_list)
-
-            # Execute the concatenated code in a new globals dict
-            agent_ns = {"__name__": "__agent_notebook__"}
-            exec(code_cells, agent_ns)
+            started = time.perf_counter()
+            # Compiled agent cells are cached on disk by notebook content hash
+            agent_ns, cached = load_notebook(AGENT_NOTEBOOK)
+            elapsed = time.perf_counter() - started
 
             if AGENT_VAR in agent_ns:
                 agent_obj = agent_ns[AGENT_VAR]
                 _agent_runner = _ensure_async_generator(agent_obj)
-                print(f"Loaded agent from notebook: {AGENT_NOTEBOOK}, var: {AGENT_VAR}")
+                print(f"Loaded agent from notebook: {AGENT_NOTEBOOK}, var: {AGENT_VAR} "
+                      f"({elapsed:.2f}s, {'cached' if cached else 'compiled'})")
             else:
                 print(f"Notebook loaded but variable '{AGENT_VAR}' not found in {AGENT_NOTEBOOK}")
         except Exception as e:
@@ -178,16 +287,74 @@ async def run_agent_stream(question: str):
 
 
 
+# Number of upcoming /api/ask requests to profile, armed via /api/admin/profile
+_profile_next = 0
+
+
+def _should_profile(x_profile: Optional[str]) -> bool:
+    global _profile_next
+    if not PROFILING_ENABLED:
+        return False
+    if x_profile and x_profile.lower() not in ("0", "false", "no"):
+        return True
+    if _profile_next > 0:
+        _profile_next -= 1
+        return True
+    return False
+
+
 @app.post("/api/ask")
-async def ask(query: Query):
+async def ask(query: Query, x_profile: Optional[str] = Header(default=None)):
+    profile = _should_profile(x_profile)
+
     async def event_generator():
         # Stream JSON lines (newline-delimited JSON)
-        async for item in run_agent_stream(query.question):
-            yield json.dumps(item) + "\n"
+        if not profile:
+            async for item in run_agent_stream(query.question):
+                yield json.dumps(item) + "\n"
+            return
+
+        # Profiled request: sample the event loop and executor threads, then report the profile id
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            async for item in run_agent_stream(query.question):
+                yield json.dumps(item) + "\n"
+        finally:
+            profiler.stop()
+            try:
+                profiler.save()
+                saved = True
+                print(f"Saved profile {profiler.id} ({profiler.samples} samples)", flush=True)
+            except OSError as e:
+                saved = False
+                print(f"Could not save profile {profiler.id}: {e}", flush=True)
+        if saved:
+            yield json.dumps({"type": "profile", "id": profiler.id, "samples": profiler.samples}) + "\n"
+        else:
+            yield json.dumps({"type": "error", "text": "Profile could not be saved (see server log)"}) + "\n"
 
     return StreamingResponse(event_generator(), media_type="application/json")
 
 
+@app.post("/api/admin/profile")
+async def arm_profile(count: int = 1):
+    """Profile the next `count` /api/ask requests (same as sending `X-Profile: 1`)."""
+    global _profile_next
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set AGENT_PROFILING=1)")
+    _profile_next = max(0, count)
+    return {"armed": _profile_next}
+
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """Download a collapsed-stack profile, e.g. for flamegraph.pl or speedscope."""
+    if not PROFILING_ENABLED or not is_profile_id(profile_id) or not profile_path(profile_id).exists():
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(profile_path(profile_id), media_type="text/plain", filename=f"{profile_id}.folded")
+
+
 @app.get("/")
 async def index():
     # Serve the legacy static UI if present
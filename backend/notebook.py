@@ -0,0 +1,95 @@
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+import stat
+from pathlib import Path
+from types import CodeType
+from typing import Tuple
+
+# Compiled notebook code is cached here as <path hash>-<content hash>.bin, one entry per
+# notebook (older entries for the same path are removed when it is recompiled). The cached code
+# is exec'd, so the directory must be private to the user running the backend (not /tmp).
+NOTEBOOK_CACHE_DIR = os.getenv(
+    "AGENT_NOTEBOOK_CACHE",
+    os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "agent_notebook"),
+)
+# Cells tagged with this (cell metadata "tags") are interactive setup/tests and are not run by the backend
+SKIP_TAG = "agent-skip"
+
+
+def extract_agent_source(nb: dict) -> str:
+    """Concatenate the source of all code cells that are not tagged SKIP_TAG."""
+    code_list = []
+    for cell in nb.get("cells", []):
+        if cell.get("cell_type") != "code":
+            continue
+        if SKIP_TAG in cell.get("metadata", {}).get("tags", []):
+            continue
+        src = cell.get("source", "")
+        if isinstance(src, list):
+            src = "".join(src)
+        code_list.append(src)
+    return "\n\n".join(code_list)
+
+
+def compile_notebook(path: str) -> Tuple[CodeType, bool]:
+    """Return the compiled agent code of a notebook and whether it came from the cache.
+
+    The cache key covers the notebook bytes and the interpreter's bytecode magic, so
+    editing the notebook (or its tags) or upgrading Python recompiles it.
+    """
+    nb_path = os.path.abspath(path)
+    with open(nb_path, "rb") as fh:
+        raw = fh.read()
+
+    path_key = hashlib.sha256(nb_path.encode("utf-8")).hexdigest()[:16]
+    key = hashlib.sha256(importlib.util.MAGIC_NUMBER + raw).hexdigest()
+    cache_dir = Path(NOTEBOOK_CACHE_DIR)
+    cache_file = cache_dir / f"{path_key}-{key}.bin"
+    try:
+        if _is_private(cache_dir) and _is_private(cache_file):
+            with open(cache_file, "rb") as fh:
+                return marshal.load(fh), True
+        elif cache_file.exists():
+            print(f"Ignoring notebook cache {cache_file}: not owned by this user or writable by others")
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    source = extract_agent_source(json.loads(raw.decode("utf-8")))
+    code = compile(source, nb_path, "exec")
+
+    try:
+        cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not _is_private(cache_dir):
+            raise OSError(f"{cache_dir} is not owned by this user or is writable by others")
+        # Write to a temp file and rename so concurrent workers never read a partial cache entry
+        tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as fh:
+            marshal.dump(code, fh)
+        os.replace(tmp, cache_file)
+        # Drop entries compiled from earlier versions of this notebook
+        for stale in cache_dir.glob(f"{path_key}-*.bin"):
+            if stale != cache_file:
+                stale.unlink(missing_ok=True)
+    except OSError as e:
+        print(f"Could not cache compiled notebook {path}: {e}")
+    return code, False
+
+
+def _is_private(path: Path) -> bool:
+    """True if path is a real file/dir owned by the current user and not writable by group or others."""
+    st = os.lstat(path)
+    if stat.S_ISLNK(st.st_mode) or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return False
+    return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+
+def load_notebook(path: str) -> Tuple[dict, bool]:
+    """Execute a notebook's agent cells and return (namespace, loaded_from_cache)."""
+    code, cached = compile_notebook(path)
+    agent_ns = {"__name__": "__agent_notebook__", "__file__": os.path.abspath(path)}
+    exec(code, agent_ns)
+    return agent_ns, cached
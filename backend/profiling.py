@@ -0,0 +1,158 @@
+import contextvars
+import functools
+import os
+import stat
+import sys
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Optional, Set
+
+# Profiling is off unless AGENT_PROFILING=1; then X-Profile and the admin endpoints are honoured
+PROFILING_ENABLED = os.getenv("AGENT_PROFILING", "0").lower() in ("1", "true", "yes")
+# Collapsed-stack profiles are written here as <id>.folded. Stacks can reveal code paths and
+# timings, so the directory must be private to the user running the backend (not /tmp).
+PROFILE_DIR = os.getenv(
+    "AGENT_PROFILE_DIR",
+    os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "agent_profiles"),
+)
+PROFILE_INTERVAL = float(os.getenv("AGENT_PROFILE_INTERVAL_MS", "5")) / 1000
+# Only the newest profiles are kept (at least the one just written)
+PROFILE_KEEP = max(1, int(os.getenv("AGENT_PROFILE_KEEP", "20")))
+
+# Profiler of the request being served; propagated into worker threads by profiled()
+_current: contextvars.ContextVar[Optional["SamplingProfiler"]] = contextvars.ContextVar("agent_profiler", default=None)
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler for a single request.
+
+    A background thread snapshots Python stacks with sys._current_frames(). It records the
+    event loop thread (so time spent waiting on the executor or the LLM shows up as the
+    loop's select()) and the worker threads currently running a function wrapped with
+    profiled() for this request. Other requests' workers are not sampled, but the event
+    loop is shared, so coroutines of concurrent requests can appear in its stacks.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.id = uuid.uuid4().hex
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_ident: Optional[int] = None
+        self._workers: Set[int] = set()
+        self._workers_lock = threading.Lock()
+        self._token = None
+
+    def start(self) -> None:
+        self._loop_ident = threading.get_ident()
+        self._token = _current.set(self)
+        self._thread = threading.Thread(target=self._run, name="agent-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                pass  # generator finalized from another context; that context never saw the profiler
+            self._token = None
+
+    def _add_worker(self, ident: int) -> None:
+        with self._workers_lock:
+            self._workers.add(ident)
+
+    def _remove_worker(self, ident: int) -> None:
+        with self._workers_lock:
+            self._workers.discard(ident)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._workers_lock:
+                workers = set(self._workers)
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                is_loop = ident == self._loop_ident
+                if not is_loop and ident not in workers:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                root = "event-loop" if is_loop else names.get(ident, str(ident))
+                self._stacks[";".join([root] + stack[::-1])] += 1
+            self.samples += 1
+
+    def save(self) -> Path:
+        """Write the profile in collapsed-stack format (flamegraph.pl, speedscope, inferno)."""
+        path = profile_path(self.id)
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not _is_private(path.parent):
+            raise PermissionError(f"{path.parent} is not owned by this user or is accessible to others")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            for stack, count in self._stacks.most_common():
+                fh.write(f"{stack} {count}\n")
+        _prune_profiles(keep=path)
+        return path
+
+
+def profiled(fn: Callable) -> Callable:
+    """Wrap fn so the thread running it is sampled by the current request's profiler.
+
+    Call this in the request's context when handing work to an executor. Without an
+    active profiler fn is returned unchanged.
+    """
+    profiler = _current.get()
+    if profiler is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        ident = threading.get_ident()
+        token = _current.set(profiler)  # so nested submissions (shard fan-out) are tagged too
+        profiler._add_worker(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler._remove_worker(ident)
+            _current.reset(token)
+
+    return wrapper
+
+
+def _prune_profiles(keep: Path) -> None:
+    """Delete the oldest profiles beyond PROFILE_KEEP, never the one at keep."""
+    files = sorted(
+        (p for p in Path(PROFILE_DIR).glob("*.folded") if p != keep),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old in files[PROFILE_KEEP - 1:]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+def _is_private(path: Path) -> bool:
+    """True if path is a real directory owned by the current user with no group/other access."""
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_mode & 0o077:
+        return False
+    return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+
+def profile_path(profile_id: str) -> Path:
+    return Path(PROFILE_DIR) / f"{profile_id}.folded"
+
+
+def is_profile_id(value: str) -> bool:
+    return len(value) == 32 and all(c in "0123456789abcdef" for c in value)
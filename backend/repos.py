@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend.profiling import profiled
+
+# Configuration for XSUAA repository scanning
+XSUAA_REPO_PATH = os.getenv("XSUAA_REPO_PATH", "/Users/I567440/Desktop/Coding/SAP/xsuaa")
+# Multiple repositories: "name=/path/a,name2=/path/b" (a bare path uses its directory name)
+XSUAA_REPOS = os.getenv("XSUAA_REPOS", "")
+SHARD_TIMEOUT = float(os.getenv("XSUAA_SHARD_TIMEOUT", "10"))  # seconds per shard
+INDEX_TTL = float(os.getenv("XSUAA_INDEX_TTL", "60"))  # seconds before a shard re-walks its files
+ALLOWED_EXTENSIONS = {".py", ".js", ".ts", ".vue", ".java", ".json", ".yaml", ".yml", ".md", ".txt", ".jsx", ".tsx"}
+BLACKLIST_DIRS = {"node_modules", "dist", "build", "__pycache__", ".git", "target", "venv", ".env"}
+BLACKLIST_FILES = {".env", ".key", ".pem", ".p12", ".jks"}
+MAX_FILE_SIZE = 1024 * 1024  # 1MB
+
+
+class RepoShard:
+    """One configured repository with its own cached file index."""
+
+    def __init__(self, name: str, root: str):
+        self.name = name
+        self.root = Path(root).expanduser().resolve()
+        self._files: List[Tuple[Path, str]] = []
+        self._built_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._rebuild: Optional[threading.Thread] = None
+
+    def exists(self) -> bool:
+        return self.root.is_dir()
+
+    def files(self, deadline: Optional[float] = None) -> List[Tuple[Path, str]]:
+        """Return (absolute path, relative path) for every scannable file, sorted by relative path.
+
+        The walk is cached for INDEX_TTL seconds so repeated searches skip os.walk/stat.
+        Rebuilds run in a background thread: once an index exists, an expired one is served
+        while it refreshes; the first build is waited for until deadline (TimeoutError), and
+        keeps running so a later search can use it even if it takes longer than one search.
+        """
+        with self._lock:
+            expired = self._built_at is None or time.monotonic() - self._built_at > INDEX_TTL
+            if expired and self._rebuild is None:
+                self._rebuild = threading.Thread(
+                    target=self._rebuild_index, name=f"xsuaa-index-{self.name}", daemon=True
+                )
+                self._rebuild.start()
+            if self._built_at is not None:
+                return self._files
+            rebuild = self._rebuild
+
+        rebuild.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if rebuild.is_alive():
+            raise TimeoutError("timed out (file index still building)")
+        with self._lock:
+            if self._built_at is None:
+                raise OSError(f"could not index {self.root}")
+            return self._files
+
+    def _rebuild_index(self) -> None:
+        try:
+            found = self._walk()
+        except Exception as e:
+            print(f"Indexing {self.root} failed: {e}")
+            with self._lock:
+                self._rebuild = None
+            return
+        with self._lock:
+            self._files, self._built_at = found, time.monotonic()
+            self._rebuild = None
+
+    def _walk(self) -> List[Tuple[Path, str]]:
+        found = []
+        for root, dirs, files in os.walk(self.root):
+            # Skip blacklisted directories
+            dirs[:] = [d for d in dirs if d not in BLACKLIST_DIRS]
+
+            for file in files:
+                # Check file extension and blacklist
+                if Path(file).suffix not in ALLOWED_EXTENSIONS:
+                    continue
+                if any(bl in file for bl in BLACKLIST_FILES):
+                    continue
+
+                file_path = Path(root) / file
+                try:
+                    if file_path.stat().st_size > MAX_FILE_SIZE:
+                        continue
+                except OSError:
+                    continue
+                found.append((file_path, file_path.relative_to(self.root).as_posix()))
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def resolve(self, rel_path: str) -> Optional[Path]:
+        """Resolve a relative path inside this repository, or None if it escapes the root."""
+        full_path = (self.root / rel_path.lstrip("/")).resolve()
+        if full_path != self.root and self.root not in full_path.parents:
+            return None
+        return full_path
+
+    def display(self, rel_path: str) -> str:
+        """Path as shown to the LLM: prefixed with the repo name when several repos are configured."""
+        if len(SHARDS) > 1:
+            return f"{self.name}/{rel_path}"
+        return rel_path
+
+
+def _parse_repos(spec: str) -> Dict[str, RepoShard]:
+    shards: Dict[str, RepoShard] = {}
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        if "=" in entry:
+            name, path = (part.strip() for part in entry.split("=", 1))
+        else:
+            path = entry
+            name = Path(entry.rstrip("/")).name
+        shards[name] = RepoShard(name, path)
+    return shards
+
+
+SHARDS: Dict[str, RepoShard] = _parse_repos(XSUAA_REPOS) or {"xsuaa": RepoShard("xsuaa", XSUAA_REPO_PATH)}
+
+_executor = ThreadPoolExecutor(max_workers=max(4, len(SHARDS)), thread_name_prefix="xsuaa-shard")
+
+
+def select_shards(repo: str = "") -> List[RepoShard]:
+    """Return the shards matching an optional repo filter (comma-separated names)."""
+    if not repo:
+        return list(SHARDS.values())
+    names = [n.strip() for n in repo.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SHARDS]
+    if unknown:
+        raise KeyError(f"Unknown repository '{', '.join(unknown)}'. Available: {', '.join(SHARDS)}")
+    return [SHARDS[n] for n in names]
+
+
+def locate(path: str, repo: str = "") -> Tuple[Optional[RepoShard], str]:
+    """Split a tool path into (shard, path relative to that shard).
+
+    With several repos configured the repo may be given explicitly or as the first path segment
+    (as search results show it); both together are accepted too. Raises KeyError for an unknown
+    repo or a list of repos.
+    """
+    path = path.lstrip("/")
+    if repo:
+        if "," in repo:
+            raise KeyError(f"Give a single repository, not '{repo}'. Available: {', '.join(SHARDS)}")
+        shard = select_shards(repo)[0]
+        head, _, rest = path.partition("/")
+        if len(SHARDS) > 1 and head == shard.name:
+            path = rest or "."
+        return shard, path
+    if len(SHARDS) == 1:
+        return next(iter(SHARDS.values())), path
+    head, _, rest = path.partition("/")
+    if head in SHARDS:
+        return SHARDS[head], rest or "."
+    return None, path
+
+
+def check_deadline(deadline: Optional[float]) -> None:
+    """Raise TimeoutError once deadline (a time.monotonic() value) has passed."""
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError("timed out")
+
+
+def fan_out(
+    scan: Callable[[RepoShard, float], list],
+    shards: Iterable[RepoShard],
+    timeout: float = SHARD_TIMEOUT,
+) -> Tuple[Dict[str, list], List[str]]:
+    """Run scan(shard, deadline) concurrently on every shard.
+
+    Returns the result list of each shard that finished, keyed by shard name, and the
+    shards that timed out or failed. Scans should call check_deadline between files so a
+    slow shard stops on its own; shards still queued at the deadline are cancelled.
+    """
+    deadline = time.monotonic() + timeout
+    futures = {_executor.submit(profiled(scan), shard, deadline): shard for shard in shards}
+    done, not_done = wait(futures, timeout=timeout)
+    for future in not_done:
+        future.cancel()
+
+    results, failed = {}, []
+    for future, shard in futures.items():
+        if future in not_done:
+            failed.append(f"{shard.name} (timed out)")
+            continue
+        try:
+            results[shard.name] = future.result()
+        except Exception as e:
+            failed.append(f"{shard.name} ({e})")
+    return results, failed
+
+
+def merge_round_robin(per_shard: Dict[str, list], k: int, key: Callable) -> Tuple[list, List[str]]:
+    """Merge per-shard results into at most k, taking one match from each shard in turn.
+
+    Every shard with matches is represented before any shard gets a second slot, so one
+    large repository cannot fill the limit on its own. The merged list is sorted by key
+    (path, line) for display. Returns it with the names of shards whose matches were cut off.
+    """
+    merged, taken = [], dict.fromkeys(per_shard, 0)
+    for rank in range(k):
+        picked = False
+        for name, matches in per_shard.items():
+            if rank < len(matches) and len(merged) < k:
+                merged.append(matches[rank])
+                taken[name] += 1
+                picked = True
+        if not picked:
+            break
+    cut_off = [name for name, matches in per_shard.items() if len(matches) > taken[name]]
+    merged.sort(key=key)
+    return merged, cut_off
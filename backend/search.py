@@ -0,0 +1,203 @@
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from backend.repos import SHARDS, check_deadline, fan_out, merge_round_robin, select_shards
+
+FILE_MATCH_LIMIT = 50
+FUNCTION_MATCH_LIMIT = 20
+
+
+@dataclass
+class Match:
+    """A single search hit; context holds (line number, text) pairs around it.
+
+    path is the display path the LLM sees (repo-prefixed when several repos are
+    configured); repo and abs_path locate the file on disk for the UI.
+    """
+    path: str
+    line: int
+    text: str
+    context: List[Tuple[int, str]] = field(default_factory=list)
+    repo: str = ""
+    abs_path: str = ""
+
+
+@dataclass
+class SearchResult:
+    """Structured output of the code search tools.
+
+    Events for the UI are built from the fields directly; render() produces the
+    compact text the LLM sees, with each file path written only once.
+    """
+    kind: str  # "files" or "functions"
+    query: str
+    matches: List[Match] = field(default_factory=list)
+    cut_off_shards: List[str] = field(default_factory=list)  # shards with more matches than shown
+    failed_shards: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def by_file(self) -> Dict[str, List[Match]]:
+        grouped: Dict[str, List[Match]] = {}
+        for m in self.matches:
+            grouped.setdefault(m.path, []).append(m)
+        return grouped
+
+    def render(self) -> str:
+        if self.error:
+            return self.error
+
+        if not self.matches:
+            if self.kind == "functions":
+                lines = [f"No function or endpoint definitions found for '{self.query}' in the XSUAA repository.",
+                         f"Tip: Try searching with search_xsuaa_files('{self.query}') for broader results."]
+            else:
+                lines = [f"No files found containing '{self.query}' in the XSUAA repository."]
+        else:
+            lines = []
+            for path, matches in self.by_file().items():
+                lines.append(path)
+                if self.kind == "functions":
+                    lines.extend(_render_context(matches))
+                else:
+                    lines.extend(f"  {m.line}: {m.text}" for m in matches)
+            if self.cut_off_shards:
+                limit = FUNCTION_MATCH_LIMIT if self.kind == "functions" else FILE_MATCH_LIMIT
+                hint = ". Use read_xsuaa_file to see complete implementations" if self.kind == "functions" else ""
+                if len(SHARDS) > 1:
+                    hint = (f"; more matches in {', '.join(self.cut_off_shards)}"
+                            f", narrow with the repo argument{hint}")
+                lines.append(f"... (showing {limit} matches{hint})")
+
+        if self.failed_shards:
+            lines.append(f"(incomplete: no results from {', '.join(self.failed_shards)})")
+        return "\n".join(lines)
+
+
+def _render_context(matches: List[Match]) -> List[str]:
+    """Context blocks for one file; overlapping windows are printed once, matched lines marked with '>'."""
+    hits = {m.line for m in matches}
+    out: List[str] = []
+    last = 0
+    for m in matches:
+        for n, text in m.context:
+            if n <= last:
+                continue
+            if last and n > last + 1:
+                out.append("  ...")
+            out.append(f"{'>' if n in hits else ' '} {n:4d} | {text}")
+            last = n
+    return out
+
+
+def _select_existing(repo: str):
+    """Resolve the repo filter to existing shards, or return an error string."""
+    try:
+        shards = select_shards(repo)
+    except KeyError as e:
+        return None, f"Error: {e.args[0]}"
+    existing = [s for s in shards if s.exists()]
+    if not existing:
+        roots = ", ".join(str(s.root) for s in shards)
+        return None, f"Error: XSUAA repository not found at {roots}"
+    return existing, None
+
+
+def _match_key(m: Match):
+    return (m.path, m.line)
+
+
+def search_files(keyword: str, file_pattern: str = "*", repo: str = "") -> SearchResult:
+    """Find lines containing keyword (case-insensitive) across the selected repositories."""
+    result = SearchResult(kind="files", query=keyword)
+    try:
+        shards, result.error = _select_existing(repo)
+        if result.error:
+            return result
+
+        keyword_lower = keyword.lower()
+        limit = FILE_MATCH_LIMIT
+
+        def scan(shard, deadline):
+            matches = []
+            for file_path, rel_path in shard.files(deadline):
+                # Check file pattern match
+                if file_pattern and file_pattern != "*" and not Path(rel_path).match(file_pattern):
+                    continue
+                check_deadline(deadline)
+                display = shard.display(rel_path)
+                try:
+                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                        for i, line in enumerate(f, 1):
+                            if keyword_lower in line.lower():
+                                matches.append(Match(display, i, line.strip(), repo=shard.name, abs_path=str(file_path)))
+                except Exception:
+                    continue
+                # Files are scanned in sorted order, so the first limit+1 matches are this shard's top-k
+                if len(matches) > limit:
+                    break
+            return matches
+
+        per_shard, result.failed_shards = fan_out(scan, shards)
+        # Limit results to avoid overwhelming the LLM, sharing the limit fairly across shards
+        result.matches, result.cut_off_shards = merge_round_robin(per_shard, limit, key=_match_key)
+    except Exception as e:
+        result.error = f"Error searching files: {str(e)}"
+    return result
+
+
+def search_functions(function_name: str, repo: str = "") -> SearchResult:
+    """Find function, method, class or endpoint definitions across the selected repositories."""
+    result = SearchResult(kind="functions", query=function_name)
+    try:
+        shards, result.error = _select_existing(repo)
+        if result.error:
+            return result
+
+        name = re.escape(function_name)
+        # Build regex patterns for different programming languages
+        patterns = [
+            # Python: def function_name, async def function_name
+            rf"(async\s+)?def\s+{name}\s*\(",
+            # JavaScript/TypeScript: function functionName, const functionName =, functionName:
+            rf"(async\s+)?function\s+{name}\s*\(",
+            rf"(const|let|var)\s+{name}\s*=\s*(async\s+)?\(",
+            rf"{name}\s*:\s*(async\s+)?\(",
+            # Java: public/private/protected returnType functionName(
+            rf"(public|private|protected)\s+\w+\s+{name}\s*\(",
+            # REST endpoints with the function name in path or handler
+            rf"@(app|router|RequestMapping|GetMapping|PostMapping|PutMapping|DeleteMapping|PatchMapping).*{name}",
+            rf"(app|router)\.(get|post|put|delete|patch)\([^)]*{name}",
+            # Class definitions
+            rf"class\s+{name}",
+        ]
+        compiled = [re.compile(p, re.IGNORECASE) for p in patterns]
+        limit = FUNCTION_MATCH_LIMIT
+
+        def scan(shard, deadline):
+            matches = []
+            for file_path, rel_path in shard.files(deadline):
+                check_deadline(deadline)
+                try:
+                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                        lines = f.readlines()
+
+                    for i, line in enumerate(lines, 1):
+                        # Check if any pattern matches (don't match multiple patterns on same line)
+                        if any(p.search(line) for p in compiled):
+                            # Include context: 2 lines before and 5 lines after
+                            context = [(j + 1, lines[j].rstrip()) for j in range(max(0, i - 3), min(len(lines), i + 6))]
+                            matches.append(Match(shard.display(rel_path), i, line.strip(), context,
+                                                 repo=shard.name, abs_path=str(file_path)))
+                except Exception:
+                    continue
+                if len(matches) > limit:
+                    break
+            return matches
+
+        per_shard, result.failed_shards = fan_out(scan, shards)
+        result.matches, result.cut_off_shards = merge_round_robin(per_shard, limit, key=_match_key)
+    except Exception as e:
+        result.error = f"Error searching for functions: {str(e)}"
+    return result